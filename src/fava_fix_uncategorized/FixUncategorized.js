@@ -282,7 +282,7 @@ function filterTransactions() {
 function loadTransactions() {
   const params = window.location.search;
   // Load transactions on page load
-  fetch("list" + params)
+  return fetch("list" + params)
     .then(res => res.json())
     .then(data => {
       if (data.success) {
@@ -297,6 +297,12 @@ function loadTransactions() {
     });
 }
 
+// Drop unsaved changes and show the freshly loaded list, without reloading the page
+function resetTransactions() {
+  document.getElementById('only-uncategorized').checked = true;
+  return loadTransactions();
+}
+
 function ensureAwesompleteLoaded() {
   if (typeof Awesomplete !== "undefined") return Promise.resolve();
 
@@ -325,6 +331,7 @@ export default {
 
     await ensureAwesompleteLoaded();
     loadTransactions();
+    window.__fixUncatReset = resetTransactions;
   
     document.getElementById('only-uncategorized').addEventListener('change', filterTransactions);
   
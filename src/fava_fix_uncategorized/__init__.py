@@ -1,9 +1,15 @@
 import functools
+import hashlib
 import logging
 import os 
+import sys
+import threading
 import traceback
 import re
+from collections import defaultdict
+from pathlib import Path
 
+from flask import Response
 from flask import jsonify
 from flask import request
 
@@ -12,14 +18,31 @@ from fava.ext import extension_endpoint
 from fava.helpers import FavaAPIError
 from fava.beans.abc import Transaction
 from fava.beans.funcs import hash_entry
+from fava.core.file import GeneratedEntryError
+from fava.core.file import find_entry_lines
 from fava.core.file import get_entry_slice
 from fava.util.date import parse_date
 
+try:
+    import orjson
+except ImportError:  # optional, only used to speed up the list response
+    orjson = None
 
 logger = logging.getLogger(__name__)
 if loglevel := os.environ.get("LOGLEVEL"):
     logger.setLevel(loglevel.upper())
 
+_DIGITS = frozenset("0123456789")
+_SEPARATORS = frozenset(".,")
+_AMOUNT_STRIP = str.maketrans("", "", ", ")
+_INDENT_RE = re.compile(r"^[ \t]+", re.MULTILINE)
+_EDITABLE_POSTING_RE = re.compile(r"^[ \t]*(?:Expenses|Income):.*(?:\r?\n)?", re.MULTILINE)
+_EXPENSE_ACCOUNT_PREFIXES = ("Expenses:Family:", "Expenses:BusinessStukas:", "Income:BusinessStukas:")
+_EDITABLE_ACCOUNT_PREFIXES = ("Expenses:", "Income:")
+UNCLASSIFIED_ACCOUNT = sys.intern("Expenses:Family:Unclassified")
+# used for source file writes if fava's FileModule has no _lock of its own
+_FALLBACK_FILE_LOCK = threading.Lock()
+
 def api_response(func):
     """return {success: true, data: ...} or {success: false, error: ...}"""
 
@@ -37,46 +60,82 @@ def api_response(func):
     return decorator
 
 
-def normalize_and_validate_posting(posting):
+def _parse_amount(amount):
     """
-    Normalize postings: uppercase currency and validate format.
-    Ignores misplaced/absent commas and re-formats properly.
+    Split an amount into its number and optional currency.
+
+    The number is an optional "-" followed by digit groups separated by "." or ",",
+    the currency an optional 3-letter code, e.g. "-1,234.56 chf" or "12usd".
 
     Args:
-        postings (dict): Each dict has 'account' and 'amount'.
+        amount (str): Amount as typed by the user, already stripped.
 
     Returns:
-        dict: Postings with normalized amounts.
+        tuple[str, str | None]: Number without commas/whitespace, and currency as typed.
 
     Raises:
-        ValueError: If any amount doesn't match required format.
+        ValueError: If the amount doesn't match the required format.
     """
-    pattern = re.compile(r"""
-        (?P<number>\-?\s*\d+(?:[.,]\d+)*(?:[.]\d{2})?|\d+)  # number with optional commas/decimals
-        \s*
-        (?P<currency>[A-Za-z]{3})?   # optional 3-letter currency
-        $
-    """, re.VERBOSE)
+    currency = None
+    tail = amount[-3:]
+    if len(amount) > 3 and tail.isascii() and tail.isalpha():
+        currency = tail
+        number = amount[:-3].rstrip()
+    else:
+        number = amount
+
+    digits = number[1:].lstrip() if number.startswith("-") else number
+    after_digit = False
+    for ch in digits:
+        if ch in _DIGITS:
+            after_digit = True
+        elif ch in _SEPARATORS and after_digit:
+            after_digit = False
+        else:
+            raise ValueError(f"Invalid amount format: {amount}")
+    if not after_digit:
+        # empty number or trailing separator
+        raise ValueError(f"Invalid amount format: {amount}")
 
-    amount = posting.get("amount", "").strip()
+    return number.translate(_AMOUNT_STRIP), currency  # remove commas and whitespace
 
-    if amount:
-        match = pattern.match(amount)
-        if not match:
-            raise ValueError(f"Invalid amount format: {amount}")
 
-        number = match.group("number").replace(",", "").replace(" ", "")  # remove commas and whitespace
-        currency = match.group("currency")
+@functools.lru_cache(maxsize=4096)
+def _normalize_amount(amount):
+    """
+    Format a stripped, non-empty amount as "number CURRENCY".
+    Amounts repeat a lot across postings, so results are cached.
 
-        if currency:
-            currency = currency.upper()
-        else:
-            currency = "CHF"   # default
+    Raises:
+        ValueError: If the amount doesn't match the required format.
+    """
+    number, currency = _parse_amount(amount)
 
-        posting["amount"] = f"{number} {currency}"
+    if currency:
+        if not currency.isupper():  # usually typed in upper case already
+            currency = currency.upper()
     else:
-        posting["amount"] = ""
+        currency = "CHF"   # default
 
+    return f"{number} {currency}"
+
+
+def normalize_and_validate_posting(posting):
+    """
+    Normalize postings: uppercase currency and validate format.
+    Ignores misplaced/absent commas and re-formats properly.
+
+    Args:
+        postings (dict): Each dict has 'account' and 'amount'.
+
+    Returns:
+        dict: Postings with normalized amounts.
+
+    Raises:
+        ValueError: If any amount doesn't match required format.
+    """
+    amount = posting.get("amount", "").strip()
+    posting["amount"] = _normalize_amount(amount) if amount else ""
     return posting
 
 
@@ -92,35 +151,23 @@ def replace_unclassified_posting(entry_str, new_postings):
         str: Modified transaction text.
     """
 
-    lines = entry_str.splitlines()
-    kept_lines = []
-    min_indent = None
-
-    for line in lines:
-        stripped = line.lstrip()
-        indent_len = len(line) - len(stripped)
-        if indent_len != 0 and (min_indent is None or indent_len < min_indent):
-            min_indent = indent_len
-        if not stripped.startswith("Expenses:") and not stripped.startswith("Income:"):
-            kept_lines.append(line)
-
-    indent = " " * (min_indent if min_indent is not None else 2)
-
-    validated_postings = []
+    indent = " " * min(map(len, _INDENT_RE.findall(entry_str)), default=2)
+    # kept lines first, then one line per valid posting, joined once at the end
+    out = [_EDITABLE_POSTING_RE.sub("", entry_str).rstrip("\n")]
     for p in new_postings:
         try:
-            validated_postings.append(normalize_and_validate_posting(p))
+            p = normalize_and_validate_posting(p)
         except Exception:
             # TODO find a better way
             continue
+        out.append(f"{indent}{p['account']} {p['amount']}")
 
-    new_posting_lines = [f"{indent}{p['account']} {p['amount']}" for p in validated_postings]
-    if (len(new_posting_lines) == 0):
-        new_posting_lines.append(f"{indent}Expenses:Family:Unclassified")
+    if (len(out) == 1):
+        out.append(f"{indent}{UNCLASSIFIED_ACCOUNT}")
     else:
-        new_posting_lines.append(f"{indent}Expenses:Family:Unclassified 0 CHF")
+        out.append(f"{indent}{UNCLASSIFIED_ACCOUNT} 0 CHF")
 
-    return "\n".join(kept_lines + new_posting_lines)
+    return "\n".join(out)
 
 
 def change_narration(entry_str, new_narration):
@@ -134,11 +181,13 @@ def change_narration(entry_str, new_narration):
     Returns:
         str: Modified transaction text with updated narration.
     """
-    lines = entry_str.splitlines()
-    if not lines:
-        return entry_str
-    
-    first_line = lines[0]
+    # Only the first line changes; keep the rest of the entry as an untouched tail
+    newline = entry_str.find("\n")
+    if newline == -1:
+        first_line, tail = entry_str, ""
+    else:
+        first_line, tail = entry_str[:newline], entry_str[newline:]
+
     if '*' not in first_line:
         return entry_str
     
@@ -147,33 +196,50 @@ def change_narration(entry_str, new_narration):
         new_narration = new_narration.replace('"', '')
     
     # Parse transaction line: date * "payee" "narration"
-    parts = first_line.split('"')
+    quotes = first_line.count('"')
     
     # Check if we have proper quote structure (even number means closed quotes)
-    if len(parts) % 2 == 0:
+    if quotes % 2 == 1:
         return entry_str  # Malformed quotes, return unchanged
     
-    if len(parts) >= 4:
-        # Has both payee and narration: replace narration (index 3)
+    if quotes >= 4:
+        # Has both payee and narration: replace narration (between the 3rd and 4th quote)
+        payee_end = first_line.find('"', first_line.find('"') + 1)
+        narration_start = first_line.find('"', payee_end + 1)
+        narration_end = first_line.find('"', narration_start + 1)
+        prefix = first_line[:narration_start]  # date * "payee"
         if new_narration == "":
             # Remove narration entirely - keep only payee part and trim trailing space
-            lines[0] = '"'.join(parts[:3]).rstrip()
+            first_line = prefix.rstrip()
         else:
-            parts[3] = new_narration
-            lines[0] = '"'.join(parts)
-    elif len(parts) >= 3:
+            first_line = f'{prefix}"{new_narration}"' + first_line[narration_end + 1:]
+    elif quotes == 2:
         # Has only payee: add narration if not empty
         if new_narration:
-            # Insert narration: parts[0] + "payee" + parts[2] + " \"" + narration + "\""
-            lines[0] = '"'.join(parts[:3]) + ' "' + new_narration + '"'
+            first_line = f'{first_line} "{new_narration}"'
     
-    return "\n".join(lines)
+    return first_line + tail
 
 
 class FixUncategorized(FavaExtensionBase):
     report_title = "Fix Uncategorized"
     has_js_module = True
 
+    def __init__(self, ledger, config=None):
+        super().__init__(ledger, config)
+        # sorted expense accounts, reset in after_load_file()
+        self._expense_accounts_cache = None
+        # (expense_accounts() list, its serialized orjson.Fragment)
+        self._expense_accounts_fragment = None
+        # lineno -> error messages, reset in after_load_file()
+        self._errors_cache = None
+
+    def after_load_file(self):
+        # drop results derived from the previous load, so they don't keep its entries alive
+        self._expense_accounts_cache = None
+        self._expense_accounts_fragment = None
+        self._errors_cache = None
+
     @extension_endpoint("save", methods=["POST"])
     @api_response
     def save(self):
@@ -181,6 +247,8 @@ class FixUncategorized(FavaExtensionBase):
         txns = data.get("transactions", [])
 
         results = []
+        # source file -> [(hash, entry, lineno, new_string, sha256sum)]
+        pending = {}
 
         # TODO we should try to save all transactions, and return errors for those that fail only
         for txn in txns:
@@ -191,18 +259,20 @@ class FixUncategorized(FavaExtensionBase):
             if not entry:
                 raise FavaAPIError(f"Entry with hash {hash} not found")
 
-            slice_string, sha256sum = get_entry_slice(entry)
+            try:
+                slice_string, sha256sum = get_entry_slice(entry)
+            except Exception as e:
+                raise FavaAPIError(f"Failed to save transaction at line {lineno}: {str(e)}")
             new_string = replace_unclassified_posting(slice_string, txn["postings"])
             
-            # Apply narration change if provided
+            # Apply narration change if provided and different from the one shown by list()
             new_narration = txn.get("narration")
-            if new_narration is not None:
+            if new_narration is not None and new_narration != (entry.narration if entry.payee else ""):
                 new_string = change_narration(new_string, new_narration)
 
-            try:
-                self.ledger.file.save_entry_slice(hash, new_string, sha256sum)
-            except Exception as e:
-                raise FavaAPIError(f"Failed to save transaction at line {lineno}: {str(e)}")
+            # Nothing to write if the edit leaves the entry as it is
+            if new_string != slice_string:
+                pending.setdefault(entry.meta["filename"], []).append((hash, entry, lineno, new_string, sha256sum))
 
             results.append({
                 "lineno": lineno,
@@ -212,6 +282,9 @@ class FixUncategorized(FavaExtensionBase):
                 "new_slice": new_string,
             })
 
+        for filename, patches in pending.items():
+            self._save_entry_slices(filename, patches)
+
         return results
 
     @extension_endpoint("list", methods=["GET"])
@@ -225,76 +298,138 @@ class FixUncategorized(FavaExtensionBase):
             except Exception:
                 parsed_time = None
 
+        # Iterate over all transactions, not just uncategorized
+        transactions = self.ledger.all_entries_by_type.Transaction
+        if parsed_time is not None:
+            # start_date or end_date can be None, meaning unbounded; end_date is exclusive
+            start_date, end_date = parsed_time
+            transactions = [
+                txn for txn in transactions
+                if (start_date is None or txn.date >= start_date) and (end_date is None or txn.date < end_date)
+            ]
+
         error_map = self._get_errors()
+        # local lookups in the posting loop
+        unclassified_account = UNCLASSIFIED_ACCOUNT
+        editable_prefixes = _EDITABLE_ACCOUNT_PREFIXES
         entries = []
-        # Iterate over all transactions, not just uncategorized
-        for txn in self.ledger.all_entries_by_type.Transaction:
-            if not self._is_in_interval(txn, parsed_time):
-                continue
-            unclassified = self._has_uncategorized_posting(txn)
+        for txn in transactions:
+            # Single pass over the postings: collect the displayed ones and flag Unclassified
+            unclassified = False
+            postings = []
+            for p in txn.postings:
+                account = p.account
+                if account == unclassified_account:
+                    unclassified = True
+                    continue
+                postings.append({
+                    "account": account,
+                    "amount": f"{p.units.number} {p.units.currency}" if p.units else "",
+                    "editable": account.startswith(editable_prefixes)
+                })
+
+            lineno = txn.meta.get("lineno")
             entries.append({
-                "lineno": txn.meta.get("lineno"),
+                "lineno": lineno,
                 "hash": hash_entry(txn),
                 "date": txn.date.isoformat(),
                 "narration": txn.narration if txn.payee else "",
                 "payee": txn.payee if txn.payee else txn.narration,
-                "errors": error_map.get(txn.meta.get("lineno")),
-                "postings": [
-                    {
-                        "account": p.account,
-                        "amount": f"{p.units.number} {p.units.currency}" if p.units else "",
-                        "editable": p.account.startswith("Expenses:") or p.account.startswith("Income:")
-                    }
-                    for p in txn.postings
-                    if p.account != "Expenses:Family:Unclassified"
-                ],
+                "errors": error_map.get(lineno),
+                "postings": postings,
                 "unclassified": unclassified
             })
         
         # Include expense accounts in the response for frontend use
-        expense_accounts = self.expense_accounts()
-        
-        return jsonify(success=True, transactions=entries, expense_accounts=expense_accounts)
+        if orjson is None:
+            return jsonify(success=True, transactions=entries, expense_accounts=self.expense_accounts())
 
-    def _get_errors(self):
-        error_map = {}
-        for err in self.ledger.errors:
-            if err.source is not None:
-                lineno = err.source.get("lineno")
-                if lineno is not None:
-                    error_map.setdefault(lineno, []).append(err.message)
-        return error_map
+        payload = {"success": True, "transactions": entries, "expense_accounts": self._expense_accounts_json()}
+        return Response(orjson.dumps(payload), mimetype="application/json")
+
+    def _save_entry_slices(self, filename, patches):
+        """
+        Replace the source of one or more entries of one file, reading and writing it only once.
 
-    def _is_in_interval(self, txn, parsed_time):
-        """Return True if txn.date falls within the parsed_time interval.
+        Args:
+            filename (str): Source file of the entries.
+            patches (list[tuple]): (hash, entry, lineno, new_string, sha256sum) for each entry.
 
-        parsed_time: tuple (start_date, end_date)
-        - start_date or end_date can be None, meaning unbounded.
+        Raises:
+            FavaAPIError: If an entry is generated, changed since its slice was read, or the
+                file can't be read or written. Nothing is written if a check fails.
         """
-        if parsed_time is None:
-            return True
+        # The same entry listed twice in one request: the last edit wins
+        patches = list({patch[0]: patch for patch in patches}.values())
+        # Fava's own file writes (source editor, single entry saves) hold this lock too
+        lock = getattr(self.ledger.file, "_lock", None) or _FALLBACK_FILE_LOCK
 
-        start_date, end_date = parsed_time
-        d = txn.date
+        path = Path(filename)
+        lineno = patches[0][2]
+        try:
+            with lock:
+                if filename.startswith("<"):
+                    raise GeneratedEntryError()
+
+                with path.open("rb") as file:
+                    newline = "\r\n" if file.readline().endswith(b"\r\n") else "\n"
+                with path.open(encoding="utf-8") as file:
+                    lines = file.readlines()
+
+                # Splice bottom-up so the line numbers of the remaining entries stay valid
+                for _, entry, lineno, new_string, sha256sum in sorted(
+                    patches, key=lambda patch: patch[1].meta["lineno"], reverse=True
+                ):
+                    if not entry.meta.get("lineno"):
+                        raise GeneratedEntryError()
+                    first_line = entry.meta["lineno"] - 1
+                    entry_lines = find_entry_lines(lines, first_line)
+                    current = "".join(entry_lines).rstrip("\n")
+                    if hashlib.sha256(current.encode("utf-8")).hexdigest() != sha256sum:
+                        raise FavaAPIError(f"The file at '{filename}' changed externally.")
+                    lines[first_line:first_line + len(entry_lines)] = [new_string + "\n"]
+
+                # Rewrite the file in place like fava does, keeping its inode, owner and links
+                with path.open("w", encoding="utf-8", newline=newline) as file:
+                    file.writelines(lines)
+
+                self.ledger.watcher.notify(path)
+                for _, entry, _, new_string, _ in patches:
+                    self.ledger.extensions.after_entry_modified(entry, new_string)
+        except Exception as e:
+            raise FavaAPIError(f"Failed to save transaction at line {lineno}: {str(e)}")
 
-        if start_date is not None and d < start_date:
-            return False
-        if end_date is not None and d > end_date:
-            return False
+    def _get_errors(self):
+        # ledger errors are only recomputed on a (re)load, which resets this cache
+        if self._errors_cache is not None:
+            return self._errors_cache
 
-        return True
+        error_map = defaultdict(list)
+        for err in self.ledger.errors:
+            if err.source is not None:
+                lineno = err.source.get("lineno")
+                if lineno is not None:
+                    error_map[lineno].append(err.message)
+        self._errors_cache = error_map
+        return error_map
 
     def expense_accounts(self):
-        return sorted([
-            acc for acc in self.ledger.accounts
-            if (acc.startswith("Expenses:Family:") or acc.startswith("Expenses:BusinessStukas:") or acc.startswith("Income:BusinessStukas:")) 
-                and not acc.startswith("Expenses:Family:Unclassified")
-        ])
+        # the account set only changes on a ledger (re)load, which resets this cache
+        if self._expense_accounts_cache is not None:
+            return self._expense_accounts_cache
 
-
-    def _has_uncategorized_posting(self, txn):
-        for posting in txn.postings:
-            if posting.account == "Expenses:Family:Unclassified":
-                return True
-        return False
+        accounts = sorted(
+            acc for acc in self.ledger.accounts
+            if acc.startswith(_EXPENSE_ACCOUNT_PREFIXES) and not acc.startswith(UNCLASSIFIED_ACCOUNT)
+        )
+        self._expense_accounts_cache = accounts
+        return accounts
+
+
+    def _expense_accounts_json(self):
+        """Return expense_accounts() as a pre-serialized orjson fragment, rebuilt with the account cache."""
+        accounts = self.expense_accounts()
+        if self._expense_accounts_fragment is None or self._expense_accounts_fragment[0] is not accounts:
+            self._expense_accounts_fragment = (accounts, orjson.Fragment(orjson.dumps(accounts)))
+        return self._expense_accounts_fragment[1]
     
\ No newline at end of file
@@ -1,18 +1,26 @@
 import pytest
-import tempfile
 import subprocess
 import socket
+import tempfile
 import time
 import os
 import requests
 from pathlib import Path
+from playwright.sync_api import expect
 from playwright.sync_api import sync_playwright
 
 
-@pytest.fixture(scope="session")
-def test_ledger():
-    """Create a temporary beancount file for testing."""
-    ledger_content = '''1980-05-12 custom "fava-extension" "fava_fix_uncategorized"
+# Assertions here resolve in well under a second; page loads and reloads get a longer timeout
+expect.set_options(timeout=2_000)
+
+# Opt-in: with FAVA_REUSE=1 the Fava process outlives the test session and is reused by later runs
+REUSE_SERVER = os.environ.get("FAVA_REUSE") == "1"
+# Under pytest-xdist each worker runs its own session, so each one keeps its own reusable server
+REUSE_DIR = Path(tempfile.gettempdir()) / "_".join(
+    filter(None, ["fava_e2e", os.environ.get("PYTEST_XDIST_WORKER")])
+)
+
+LEDGER_CONTENT = '''1980-05-12 custom "fava-extension" "fava_fix_uncategorized"
 
 1990-01-01 open Assets:Checking
 1990-01-01 open Expenses:Family:Unclassified
@@ -36,16 +44,68 @@ def test_ledger():
   Assets:Checking              -65.00 CHF
   Expenses:Family:Unclassified  65.00 CHF
 '''
-    
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.beancount', delete=False) as f:
-        f.write(ledger_content)
-        return Path(f.name)
+
+
+def wait_for_server(port, process=None, timeout=15):
+    """Poll GET / until the server answers; return the response, or None on timeout or exit."""
+    deadline = time.monotonic() + timeout
+    while (process is None or process.poll() is None) and time.monotonic() < deadline:
+        try:
+            response = requests.get(f"http://127.0.0.1:{port}", timeout=0.25, allow_redirects=False)
+            if response.status_code < 500:
+                return response
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def ledger_base_url(port, response):
+    """Follow the redirect of / to get the base URL of the ledger."""
+    if response.status_code in [301, 302]:
+        redirect_url = response.headers.get('Location', '')
+        # Extract ledger base from redirect (e.g. /beancount/income_statement/ -> beancount)
+        ledger_base = redirect_url.strip('/').split('/')[0]
+        return f"http://127.0.0.1:{port}/{ledger_base}"
+    # Fallback
+    return f"http://127.0.0.1:{port}/beancount"
+
+
+def reusable_server_port():
+    """Port of the Fava process left running by an earlier FAVA_REUSE run, if it is still alive."""
+    try:
+        pid = int((REUSE_DIR / "fava.pid").read_text())
+        port = int((REUSE_DIR / "fava.port").read_text())
+        os.kill(pid, 0)
+    except (OSError, ValueError):
+        return None
+    return port
+
+
+@pytest.fixture(scope="session")
+def test_ledger(tmp_path_factory):
+    """Create a temporary beancount file for testing."""
+    if REUSE_SERVER:
+        # Stable path the reused server keeps watching; rewriting it undoes earlier runs' saves
+        REUSE_DIR.mkdir(exist_ok=True)
+        ledger_path = REUSE_DIR / "test.beancount"
+    else:
+        # pytest removes old basetemp directories itself, no manual cleanup needed
+        ledger_path = tmp_path_factory.mktemp("ledger") / "test.beancount"
+    ledger_path.write_text(LEDGER_CONTENT)
+    return ledger_path
 
 
 @pytest.fixture(scope="session") 
 def fava_server(test_ledger):
     """Start a Fava server with the plugin enabled for testing."""
-    
+    if REUSE_SERVER and (port := reusable_server_port()) is not None:
+        response = wait_for_server(port)
+        if response is not None:
+            print(f"Reusing Fava on http://127.0.0.1:{port}")
+            yield ledger_base_url(port, response)
+            return
+
     # Find available port
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.bind(('', 0))
@@ -59,56 +119,121 @@ def fava_server(test_ledger):
     print(f"Starting Fava on http://127.0.0.1:{port}")
     
     # Start fava server
-    process = subprocess.Popen(
-        ['fava', str(test_ledger), '--port', str(port), '--host', '127.0.0.1'],
-        env=env,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT  # Capture stderr to stdout so we can see errors
-    )
+    if REUSE_SERVER:
+        # Detach it from this session and log to a file, as nobody will read a pipe after we exit
+        output = open(REUSE_DIR / "fava.log", "wb")
+        process = subprocess.Popen(
+            ['fava', str(test_ledger), '--port', str(port), '--host', '127.0.0.1'],
+            env=env,
+            stdout=output,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+        output.close()
+        (REUSE_DIR / "fava.pid").write_text(str(process.pid))
+        (REUSE_DIR / "fava.port").write_text(str(port))
+    else:
+        process = subprocess.Popen(
+            ['fava', str(test_ledger), '--port', str(port), '--host', '127.0.0.1'],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT  # Capture stderr to stdout so we can see errors
+        )
     
-    # Wait for server to start
-    time.sleep(5)
+    # Probe the server until it answers instead of sleeping a fixed time
+    response = wait_for_server(port, process)
     
     try:
         # Check if server is running
         if process.poll() is not None:
-            stdout, stderr = process.communicate()
-            raise RuntimeError(f"Fava server failed to start. stdout: {stdout.decode()}, stderr: {stderr.decode()}")
-        
-        # Follow redirect to get the correct base URL
-        response = requests.get(f"http://127.0.0.1:{port}", timeout=5, allow_redirects=False)
-        if response.status_code in [301, 302]:
-            redirect_url = response.headers.get('Location', '')
-            # Extract ledger base from redirect (e.g. /beancount/income_statement/ -> beancount)
-            ledger_base = redirect_url.strip('/').split('/')[0]
-            base_url = f"http://127.0.0.1:{port}/{ledger_base}"
-        else:
-            # Fallback
-            base_url = f"http://127.0.0.1:{port}/beancount"
+            stdout, _ = process.communicate()
+            raise RuntimeError(f"Fava server failed to start. output: {(stdout or b'').decode()}")
+        if response is None:
+            raise RuntimeError("Fava server did not become ready within 15 seconds")
         
+        base_url = ledger_base_url(port, response)
         print(f"Using base URL: {base_url}")
         yield base_url
         
     finally:
-        # Cleanup
-        if process.poll() is None:
+        # Cleanup, unless the server is meant to be reused by the next run
+        if process.poll() is None and not (REUSE_SERVER and response is not None):
             process.terminate()
             process.wait(timeout=10)
-        test_ledger.unlink()
 
 
 @pytest.fixture(scope="session")
-def browser():
+def browser_type_launch_args(browser_type_launch_args):
+    """Launch Chromium without the sandbox and the background features tests don't need."""
+    return {
+        **browser_type_launch_args,
+        "chromium_sandbox": False,
+        "args": [
+            "--no-sandbox",
+            "--disable-gpu",
+            "--disable-dev-shm-usage",
+            "--disable-extensions",
+            "--disable-background-networking",
+        ],
+    }
+
+
+@pytest.fixture(scope="session")
+def browser(browser_type_launch_args):
     """Create a browser instance for testing."""
     with sync_playwright() as p:
-        browser = p.chromium.launch()
+        browser = p.chromium.launch(**browser_type_launch_args)
         yield browser
         browser.close()
 
 
+@pytest.fixture(scope="session")
+def context(browser):
+    """Create one browser context shared by all tests."""
+    context = browser.new_context()
+    yield context
+    context.close()
+
+
 @pytest.fixture
-def page(browser):
+def page(context):
     """Create a new page for each test."""
-    page = browser.new_page()
+    page = context.new_page()
+    yield page
+    page.close()
+
+
+@pytest.fixture(scope="session")
+def _extension_page(context, fava_server):
+    """Navigate to the extension once per test session."""
+    page = context.new_page()
+    page.goto(f"{fava_server}/extension/FixUncategorized/")
+    expect(page.locator(".txn-block").first).to_be_visible(timeout=5000)
     yield page
-    page.close()
\ No newline at end of file
+    page.close()
+
+
+@pytest.fixture
+def loaded_page(_extension_page):
+    """The extension page with transactions loaded, reset after tests that left it changed."""
+    yield _extension_page
+
+    page = _extension_page
+    changed = page.locator(".txn-block.txn-modified, .txn-narration.editing").count() > 0
+    if changed or not page.locator("#only-uncategorized").is_checked():
+        # Re-fetch the list through the page's own hook instead of navigating again
+        page.evaluate("() => window.__fixUncatReset && window.__fixUncatReset()")
+        expect(page.locator(".txn-block").first).to_be_visible()
+
+
+@pytest.fixture(scope="session")
+def extension_url(fava_server):
+    """Base URL of the extension's endpoints."""
+    return f"{fava_server}/extension/FixUncategorized"
+
+
+@pytest.fixture(scope="session")
+def api():
+    """HTTP session for calling the extension endpoints without a browser."""
+    with requests.Session() as session:
+        yield session
@@ -0,0 +1,52 @@
+import pytest
+
+
+pytestmark = pytest.mark.integration
+
+
+class TestFixUncategorizedEndpoints:
+    """Integration tests for the extension endpoints of a running Fava server, without a browser."""
+
+    def get_transaction(self, api, extension_url, payee):
+        """Helper to fetch a transaction from the list endpoint by payee"""
+        response = api.get(f"{extension_url}/list")
+        assert response.ok
+        data = response.json()
+        assert data["success"] is True
+        return next(t for t in data["transactions"] if t["payee"] == payee)
+
+    def save(self, api, extension_url, txn, postings):
+        """Helper to save new postings for a transaction"""
+        response = api.post(f"{extension_url}/save", json={
+            "transactions": [{"hash": txn["hash"], "lineno": txn["lineno"], "postings": postings}]
+        })
+        assert response.ok
+        result = response.json()
+        assert result["success"] is True
+        return result
+
+    def test_add_posting_to_transaction(self, api, extension_url):
+        """Test saving a single posting for an uncategorized transaction."""
+        txn = self.get_transaction(api, extension_url, "Restaurant")
+        assert txn["unclassified"] is True
+
+        self.save(api, extension_url, txn, [{"account": "Expenses:Family:Restaurants", "amount": "80.50 CHF"}])
+
+        saved_txn = self.get_transaction(api, extension_url, "Restaurant")
+        assert {"account": "Expenses:Family:Restaurants", "amount": "80.50 CHF", "editable": True} in saved_txn["postings"]
+
+    def test_add_multiple_postings(self, api, extension_url):
+        """Test splitting a transaction into multiple postings."""
+        txn = self.get_transaction(api, extension_url, "Gas Station")
+
+        self.save(api, extension_url, txn, [
+            {"account": "Expenses:Family:Groceries", "amount": "40.00 CHF"},
+            {"account": "Expenses:Family:Restaurants", "amount": "25.00 CHF"},
+        ])
+
+        saved_txn = self.get_transaction(api, extension_url, "Gas Station")
+        editable = [p for p in saved_txn["postings"] if p["editable"]]
+        assert editable == [
+            {"account": "Expenses:Family:Groceries", "amount": "40.00 CHF", "editable": True},
+            {"account": "Expenses:Family:Restaurants", "amount": "25.00 CHF", "editable": True},
+        ]
@@ -1,152 +1,119 @@
 import pytest
-import time
 import re
 from playwright.sync_api import Page, expect
 
 
+pytestmark = pytest.mark.e2e
+
+
+def is_save_response(response):
+    """Match the response to the POST the frontend sends when saving."""
+    return response.url.endswith("/save") and response.request.method == "POST"
+
+
+def reload_extension_page(page):
+    """Reload the page and wait for its transactions to render."""
+    # A reload fetches Fava, Awesomplete and the transaction list again, like the session's first load
+    page.reload()
+    expect(page.locator(".txn-block").first).to_be_visible(timeout=5000)
+
+
 class TestFixUncategorizedFrontend:
     """End-to-end tests for the Fix Uncategorized plugin frontend."""
 
-    def test_extension_page_loads(self, page: Page, fava_server: str):
+    def test_extension_page_loads(self, loaded_page: Page):
         """Test that the Fix Uncategorized extension page loads."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
         # Should see the page title (Fava adds " - Beancount" to extension titles)
-        expect(page).to_have_title("Fix Uncategorized - Beancount")
+        expect(loaded_page).to_have_title("Fix Uncategorized - Beancount")
         
         # Should see the top bar with filter checkbox and save button
-        expect(page.locator("#only-uncategorized")).to_be_visible()
-        expect(page.locator("#save-all-btn")).to_be_visible()
+        expect(loaded_page.locator("#only-uncategorized")).to_be_visible()
+        expect(loaded_page.locator("#save-all-btn")).to_be_visible()
 
-    def test_transactions_list_displays(self, page: Page, fava_server: str):
+    def test_transactions_list_displays(self, loaded_page: Page):
         """Test that transactions are loaded and displayed."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
-        # Wait for transactions to load
-        page.wait_for_selector(".txn-block", timeout=5000)
         
         # Should see transaction blocks
-        transactions = page.locator(".txn-block")
+        transactions = loaded_page.locator(".txn-block")
         expect(transactions).to_have_count(4)  # All 4 transactions from test data
         
         # Should see uncategorized transactions highlighted
-        uncategorized_txns = page.locator(".txn-block.txn-unclassified")
+        uncategorized_txns = loaded_page.locator(".txn-block.txn-unclassified")
         expect(uncategorized_txns).to_have_count(3)  # 3 uncategorized transactions
 
-    def test_filter_only_uncategorized(self, page: Page, fava_server: str):
+    def test_filter_only_uncategorized(self, loaded_page: Page):
         """Test the 'Only uncategorized' filter functionality."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
-        # Wait for transactions to load
-        page.wait_for_selector(".txn-block", timeout=5000)
         
         # Initially, filter should be checked and only uncategorized should be visible
-        checkbox = page.locator("#only-uncategorized")
+        checkbox = loaded_page.locator("#only-uncategorized")
         expect(checkbox).to_be_checked()
         
         # Count visible transactions (should be 3 uncategorized)
-        visible_txns = page.locator(".txn-block:visible")
+        visible_txns = loaded_page.locator(".txn-block:visible")
         expect(visible_txns).to_have_count(3)
         
         # Uncheck the filter
         checkbox.uncheck()
         
         # Now all transactions should be visible (4 total)
-        visible_txns = page.locator(".txn-block:visible")
+        visible_txns = loaded_page.locator(".txn-block:visible")
         expect(visible_txns).to_have_count(4)
 
-    def test_add_posting_to_transaction(self, page: Page, fava_server: str):
-        """Test adding a posting to a transaction."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
-        # Wait for transactions to load
-        page.wait_for_selector(".txn-block", timeout=5000)
-        
-        # Find first uncategorized transaction
-        first_txn = page.locator(".txn-block.txn-unclassified").first
-        
-        # Should have at least one empty posting row
-        posting_rows = first_txn.locator(".posting-row")
-        expect(posting_rows).to_have_count(1)
-        
-        # Fill in account and amount
-        account_input = first_txn.locator(".expense-account-input").first
-        amount_input = first_txn.locator(".expense-amount").first
-        
-        account_input.fill("Expenses:Family:Groceries")
-        amount_input.fill("150.00 CHF")
-        
-        # Transaction should be marked as modified
-        expect(first_txn).to_have_class(re.compile(r".*txn-modified.*"))
-
-    def test_add_multiple_postings(self, page: Page, fava_server: str):
-        """Test adding multiple postings to split a transaction."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
-        # Wait for transactions to load
-        page.wait_for_selector(".txn-block", timeout=5000)
-        
-        # Find first uncategorized transaction
-        first_txn = page.locator(".txn-block.txn-unclassified").first
-        
-        # Fill in first posting
+    @pytest.mark.parametrize("action", [
+        "delete",
+        "move_up",
+        pytest.param("save_enter", marks=pytest.mark.xdist_group(name="mutates_ledger")),
+    ])
+    def test_posting_row_action(self, loaded_page: Page, action):
+        """Test deleting, moving and saving (with Enter) a posting row."""
+        
+        # Find first uncategorized transaction and fill in its posting
+        first_txn = loaded_page.locator(".txn-block.txn-unclassified").first
         first_txn.locator(".expense-account-input").first.fill("Expenses:Family:Groceries")
-        first_txn.locator(".expense-amount").first.fill("100.00 CHF")
-        
-        # Add another posting
-        first_txn.locator(".add-below-btn").first.click()
-        
-        # Should now have 2 posting rows
-        posting_rows = first_txn.locator(".posting-row")
-        expect(posting_rows).to_have_count(2)
-        
-        # Fill in second posting
-        account_inputs = first_txn.locator(".expense-account-input")
-        amount_inputs = first_txn.locator(".expense-amount")
-        
-        account_inputs.nth(1).fill("Expenses:Family:Restaurants")
-        amount_inputs.nth(1).fill("50.00 CHF")
-
-    def test_delete_posting_row(self, page: Page, fava_server: str):
-        """Test deleting a posting row."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
-        # Wait for transactions to load
-        page.wait_for_selector(".txn-block", timeout=5000)
-        
-        # Find first uncategorized transaction
-        first_txn = page.locator(".txn-block.txn-unclassified").first
-        
-        # Add a posting row
-        first_txn.locator(".add-below-btn").first.click()
-        
-        # Should have 2 rows
+        amount_input = first_txn.locator(".expense-amount").first
+        amount_input.fill("100.00 CHF")
         posting_rows = first_txn.locator(".posting-row")
-        expect(posting_rows).to_have_count(2)
-        
-        # Delete the second row
-        first_txn.locator(".delete-btn").nth(1).click()
         
-        # Should be back to 1 row
-        posting_rows = first_txn.locator(".posting-row")
-        expect(posting_rows).to_have_count(1)
+        if action == "delete":
+            # Add a posting row, then delete it again
+            first_txn.locator(".add-below-btn").first.click()
+            expect(posting_rows).to_have_count(2)
+            first_txn.locator(".delete-btn").nth(1).click()
+            expect(posting_rows).to_have_count(1)
+        
+        elif action == "move_up":
+            # Add a second posting and move it up
+            first_txn.locator(".add-below-btn").first.click()
+            first_txn.locator(".expense-account-input").nth(1).fill("Expenses:Family:Restaurants")
+            first_txn.locator(".expense-amount").nth(1).fill("50.00 CHF")
+            first_txn.locator(".move-up-btn").nth(1).click()
+            
+            # Verify the order changed (Restaurants should now be first)
+            expect(first_txn.locator(".expense-account-input").first).to_have_value("Expenses:Family:Restaurants")
+        
+        elif action == "save_enter":
+            # Pressing Enter while editing a posting triggers save
+            with loaded_page.expect_response(is_save_response) as save_response:
+                amount_input.press("Enter")
+            assert save_response.value.ok
+            
+            # Reload to verify the change persisted
+            reload_extension_page(loaded_page)
+            saved_txn = loaded_page.locator(".txn-block").filter(has_text="Grocery Store").first
+            expect(saved_txn.locator(".expense-account-input").first).to_have_value("Expenses:Family:Groceries")
 
-    def test_account_autocomplete(self, page: Page, fava_server: str):
+    def test_account_autocomplete(self, loaded_page: Page):
         """Test that account autocomplete works."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
-        # Wait for transactions to load
-        page.wait_for_selector(".txn-block", timeout=5000)
         
         # Find first uncategorized transaction
-        first_txn = page.locator(".txn-block.txn-unclassified").first
+        first_txn = loaded_page.locator(".txn-block.txn-unclassified").first
         account_input = first_txn.locator(".expense-account-input").first
         
         # The expense accounts list should exist in the DOM (even if hidden initially)
-        expect(page.locator("#expense-accounts-list")).to_be_attached()
+        expect(loaded_page.locator("#expense-accounts-list")).to_be_attached()
         
         # Check that it contains account options
-        account_list = page.locator("#expense-accounts-list li")
+        account_list = loaded_page.locator("#expense-accounts-list li")
         # Should have at least one account option
         expect(account_list.first).to_be_attached()
         
@@ -158,71 +125,37 @@ class TestFixUncategorizedFrontend:
         # of the Awesomplete dropdown, but we can verify the account list has entries)
         expect(account_list.first).to_contain_text("Expenses")
 
-    def test_save_functionality_requires_modifications(self, page: Page, fava_server: str):
+    @pytest.mark.xdist_group(name="mutates_ledger")
+    def test_save_functionality_requires_modifications(self, loaded_page: Page):
         """Test that save button works correctly when there are modifications."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
-        # Wait for transactions to load
-        page.wait_for_selector(".txn-block", timeout=5000)
         
         # Initially save button should be enabled but nothing to save
-        save_btn = page.locator("#save-all-btn")
+        save_btn = loaded_page.locator("#save-all-btn")
         expect(save_btn).to_be_enabled()
         
         # Make a modification
-        first_txn = page.locator(".txn-block.txn-unclassified").first
+        first_txn = loaded_page.locator(".txn-block.txn-unclassified").first
         first_txn.locator(".expense-account-input").first.fill("Expenses:Family:Groceries")
         first_txn.locator(".expense-amount").first.fill("150.00 CHF")
         
-        # Click save button (note: this will likely show an alert about no server endpoint in test)
-        save_btn.click()
+        # Click save button and wait for the server response
+        with loaded_page.expect_response(is_save_response) as save_response:
+            save_btn.click()
+        assert save_response.value.ok
         
-        # In a real test environment, we'd verify the server response
-        # For now, we just verify the save attempt was made
+        # Wait for the re-render after saving, so it doesn't overlap with the next test
+        expect(loaded_page.locator(".txn-block.txn-modified")).to_have_count(0)
 
-    def test_move_posting_up_down(self, page: Page, fava_server: str):
-        """Test moving postings up and down."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
-        # Wait for transactions to load
-        page.wait_for_selector(".txn-block", timeout=5000)
-        
-        # Find first uncategorized transaction
-        first_txn = page.locator(".txn-block.txn-unclassified").first
-        
-        # Add two postings
-        first_txn.locator(".expense-account-input").first.fill("Expenses:Family:Groceries")
-        first_txn.locator(".expense-amount").first.fill("100.00 CHF")
-        
-        first_txn.locator(".add-below-btn").first.click()
-        
-        account_inputs = first_txn.locator(".expense-account-input")
-        amount_inputs = first_txn.locator(".expense-amount")
-        
-        account_inputs.nth(1).fill("Expenses:Family:Restaurants")
-        amount_inputs.nth(1).fill("50.00 CHF")
-        
-        # Move second posting up
-        first_txn.locator(".move-up-btn").nth(1).click()
-        
-        # Verify the order changed (Restaurants should now be first)
-        first_account = first_txn.locator(".expense-account-input").first
-        expect(first_account).to_have_value("Expenses:Family:Restaurants")
-
-    def test_error_display_for_unbalanced_transaction(self, page: Page, fava_server: str):
+    def test_error_display_for_unbalanced_transaction(self, loaded_page: Page):
         """Test that errors are displayed for unbalanced transactions."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        
-        # Wait for transactions to load
-        page.wait_for_selector(".txn-block", timeout=5000)
         
         # Uncheck the filter to show all transactions (including the salary with errors)
-        checkbox = page.locator("#only-uncategorized")
+        checkbox = loaded_page.locator("#only-uncategorized")
         if checkbox.is_checked():
             checkbox.uncheck()
         
         # Find the salary transaction by looking for the text "Salary Payment" in any transaction
-        salary_txn = page.locator(".txn-block").filter(has_text="Salary Payment")
+        salary_txn = loaded_page.locator(".txn-block").filter(has_text="Salary Payment")
         expect(salary_txn).to_have_count(1)
         
         # The salary transaction should have the "error" class
@@ -237,36 +170,37 @@ class TestFixUncategorizedFrontend:
         assert any(keyword in error_text for keyword in ["balance", "imbalance", "sum"]), \
             f"Error message should mention balance issue: {error_text}"
 
-    def test_save_multiple_modifications(self, page: Page, fava_server: str):
+    @pytest.mark.xdist_group(name="mutates_ledger")
+    def test_save_multiple_modifications(self, loaded_page: Page):
         """Test that saving multiple times with different modifications works."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        page.wait_for_selector(".txn-block", timeout=5000)
         
-        first_txn = page.locator(".txn-block.txn-unclassified").first
+        first_txn = loaded_page.locator(".txn-block.txn-unclassified").first
         
         # First modification: Set to Groceries
         first_txn.locator(".expense-account-input").first.fill("Expenses:Family:Groceries")
         first_txn.locator(".expense-amount").first.fill("150.00 CHF")
-        page.locator("#save-all-btn").click()
+        with loaded_page.expect_response(is_save_response) as save_response:
+            loaded_page.locator("#save-all-btn").click()
+        assert save_response.value.ok
+        assert "Expenses:Family:Groceries 150.00 CHF" in save_response.value.json()["data"][0]["new_slice"]
         
-        # Wait for save to complete and reload data
-        page.wait_for_timeout(1000)
-        page.reload()
-        page.wait_for_selector(".txn-block", timeout=5000)
+        # The list is re-rendered after saving, which clears the modified marker
+        first_txn = loaded_page.locator(".txn-block").filter(has_text="Grocery Store").first
+        expect(first_txn).not_to_have_class(re.compile(r".*txn-modified.*"))
         
         # Second modification: Change to Restaurants
-        first_txn = page.locator(".txn-block").filter(has_text="Grocery Store").first
         first_txn.locator(".expense-account-input").first.fill("Expenses:Family:Restaurants")
         expect(first_txn).to_have_class(re.compile(r".*txn-modified.*"))
-        page.locator("#save-all-btn").click()
+        with loaded_page.expect_response(is_save_response) as save_response:
+            loaded_page.locator("#save-all-btn").click()
+        assert save_response.value.ok
+        assert "Expenses:Family:Restaurants 150.00 CHF" in save_response.value.json()["data"][0]["new_slice"]
         
         # Verify modifications persist
-        page.wait_for_timeout(1000)
-        page.reload()
-        page.wait_for_selector(".txn-block", timeout=5000)
+        reload_extension_page(loaded_page)
         
         # Should still be able to modify again
-        first_txn = page.locator(".txn-block").filter(has_text="Grocery Store").first
+        first_txn = loaded_page.locator(".txn-block").filter(has_text="Grocery Store").first
         first_txn.locator(".expense-amount").first.clear()
         first_txn.locator(".expense-amount").first.fill("175.00 CHF")
         expect(first_txn).to_have_class(re.compile(r".*txn-modified.*"))
@@ -275,36 +209,12 @@ class TestFixUncategorizedFrontend:
         account_input = first_txn.locator(".expense-account-input").first
         expect(account_input).to_have_value("Expenses:Family:Restaurants")
 
-    def test_save_with_enter_key(self, page: Page, fava_server: str):
-        """Test that pressing Enter while editing a posting triggers save."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        page.wait_for_selector(".txn-block", timeout=5000)
-        
-        first_txn = page.locator(".txn-block.txn-unclassified").first
-        
-        # Fill in account and amount, then press Enter on amount field
-        first_txn.locator(".expense-account-input").first.fill("Expenses:Family:Groceries")
-        amount_input = first_txn.locator(".expense-amount").first
-        amount_input.fill("150.00 CHF")
-        amount_input.press("Enter")
-        
-        # Wait and reload to verify save occurred
-        page.wait_for_timeout(1000)
-        page.reload()
-        page.wait_for_selector(".txn-block", timeout=5000)
-        
-        # Verify the change persisted (transaction should now show the account)
-        saved_txn = page.locator(".txn-block").filter(has_text="Grocery Store").first
-        account_input = saved_txn.locator(".expense-account-input").first
-        expect(account_input).to_have_value("Expenses:Family:Groceries")
-
-    def test_editable_narration(self, page: Page, fava_server: str):
+    @pytest.mark.xdist_group(name="mutates_ledger")
+    def test_editable_narration(self, loaded_page: Page):
         """Test that narration can be edited by clicking on it and is saved."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        page.wait_for_selector(".txn-block", timeout=5000)
         
         # Find transaction with editable narration
-        first_txn = page.locator(".txn-block").first
+        first_txn = loaded_page.locator(".txn-block").first
         narration_element = first_txn.locator(".txn-narration")
         
         # Should be visible and clickable
@@ -328,24 +238,23 @@ class TestFixUncategorizedFrontend:
         expect(narration_element).to_contain_text("Updated narration for testing")
         
         # Save the changes
-        page.locator("#save-all-btn").click()
+        with loaded_page.expect_response(is_save_response) as save_response:
+            loaded_page.locator("#save-all-btn").click()
+        assert save_response.value.ok
         
-        # Wait for save to complete and reload page to verify persistence
-        page.wait_for_timeout(1000)
-        page.reload()
-        page.wait_for_selector(".txn-block", timeout=5000)
+        # Reload page to verify persistence
+        reload_extension_page(loaded_page)
         
         # Find the same transaction and verify narration was saved
-        first_txn_after_reload = page.locator(".txn-block").first
+        first_txn_after_reload = loaded_page.locator(".txn-block").first
         narration_element_after_reload = first_txn_after_reload.locator(".txn-narration")
         expect(narration_element_after_reload).to_contain_text("Updated narration for testing")
 
-    def test_narration_editing_edge_cases(self, page: Page, fava_server: str):
+    @pytest.mark.xdist_group(name="mutates_ledger")
+    def test_narration_editing_edge_cases(self, loaded_page: Page):
         """Test edge cases for narration editing."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        page.wait_for_selector(".txn-block", timeout=5000)
         
-        first_txn = page.locator(".txn-block").first
+        first_txn = loaded_page.locator(".txn-block").first
         narration_element = first_txn.locator(".txn-narration")
         
         # Test 1: Edit narration and cancel with Escape
@@ -377,20 +286,18 @@ class TestFixUncategorizedFrontend:
         expect(narration_element).to_contain_text(text_with_quotes)
         
         # Save the changes with quotes and verify no errors occur
-        page.locator("#save-all-btn").click()
-        
-        # Wait for save to complete
-        page.wait_for_timeout(1000)
+        with loaded_page.expect_response(is_save_response) as save_response:
+            loaded_page.locator("#save-all-btn").click()
+        assert save_response.value.ok
         
         # Check that no error styling appeared on the transaction (most important check)
         expect(first_txn).not_to_have_class("error")
         
         # Reload and verify the transaction was saved (quotes will be stripped by backend)
-        page.reload()
-        page.wait_for_selector(".txn-block", timeout=5000)
+        reload_extension_page(loaded_page)
         
         # Find the transaction by looking for the text without quotes (as backend strips them)
-        saved_txn = page.locator(".txn-block").filter(has_text="Test with quotes")
+        saved_txn = loaded_page.locator(".txn-block").filter(has_text="Test with quotes")
         expect(saved_txn).to_have_count(1)  # Should find exactly one transaction
         
         narration_element_after_reload = saved_txn.locator(".txn-narration")
@@ -400,13 +307,12 @@ class TestFixUncategorizedFrontend:
         # Verify no error class on the reloaded transaction
         expect(saved_txn).not_to_have_class("error")
 
-    def test_narration_editing_with_posting_changes(self, page: Page, fava_server: str):
+    @pytest.mark.xdist_group(name="mutates_ledger")
+    def test_narration_editing_with_posting_changes(self, loaded_page: Page):
         """Test that narration editing works together with posting changes."""
-        page.goto(f"{fava_server}/extension/FixUncategorized/")
-        page.wait_for_selector(".txn-block", timeout=5000)
         
         # Find uncategorized transaction
-        uncategorized_txn = page.locator(".txn-block.txn-unclassified").first
+        uncategorized_txn = loaded_page.locator(".txn-block.txn-unclassified").first
         
         # Change both narration and postings
         narration_element = uncategorized_txn.locator(".txn-narration")
@@ -423,13 +329,13 @@ class TestFixUncategorizedFrontend:
         expect(uncategorized_txn).to_have_class(re.compile(r".*txn-modified.*"))
         
         # Save and verify both changes persist
-        page.locator("#save-all-btn").click()
-        page.wait_for_timeout(1000)
-        page.reload()
-        page.wait_for_selector(".txn-block", timeout=5000)
+        with loaded_page.expect_response(is_save_response) as save_response:
+            loaded_page.locator("#save-all-btn").click()
+        assert save_response.value.ok
+        reload_extension_page(loaded_page)
         
         # Verify narration persisted
-        saved_txn = page.locator(".txn-block").filter(has_text="Combined test").first
+        saved_txn = loaded_page.locator(".txn-block").filter(has_text="Combined test").first
         expect(saved_txn.locator(".txn-narration")).to_contain_text("Combined test: narration and posting")
         
         # Verify posting persisted
@@ -1,62 +1,88 @@
+import orjson
 import pytest
-import tempfile
-import json
 from pathlib import Path
-from unittest.mock import Mock
+from flask import Flask
 from fava.core import FavaLedger
+from fava.core.charts import FavaJSONProvider
+from fava.core.file import get_entry_slice
+from fava.helpers import FavaAPIError
+import fava_fix_uncategorized
 from fava_fix_uncategorized import FixUncategorized
 
+FIXTURES_DIR = Path(__file__).parent.parent / "fixtures"
+
+
+def _loads(response):
+    """Parse the JSON body of a response."""
+    return orjson.loads(response.data)
+
 
 class TestFixUncategorizedAPI:
     """Test the FixUncategorized API endpoints with real requests."""
 
     def assert_transaction(self, txn, expected):
         """Helper to assert transaction fields"""
-        for key, value in expected.items():
-            assert txn[key] == value
+        actual = {key: txn.get(key) for key in expected}
+        assert actual == expected, f"mismatch: {actual} vs {expected}"
 
-    @pytest.fixture
-    def test_ledger_file(self):
-        """Create a temporary beancount file for testing."""
-        ledger_content = '''1980-05-12 custom "fava-extension" "fava_fix_uncategorized"
-
-1990-01-01 open Assets:Checking
-1990-01-01 open Expenses:Family:Unclassified
-1990-01-01 open Expenses:Family:Groceries
-1990-01-01 open Expenses:Family:Restaurants
-1990-01-01 open Expenses:BusinessStukas:Office
-1990-01-01 open Income:BusinessStukas:Consulting
-1990-01-01 open Income:Salary
-1990-01-01 open Liabilities:CreditCard
-
-2024-01-01 * "Grocery Store" "Weekly groceries"
-  Assets:Checking              -150.00 CHF
-  Expenses:Family:Unclassified  150.00 CHF
-
-2024-02-03 * "Employer Inc" "Monthly salary payment"
-  Assets:Checking             2500.00 CHF
-  Income:Salary              -2000.00 CHF
-'''
-        
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.beancount', delete=False) as f:
-            f.write(ledger_content)
-            f.flush()  # Ensure content is written to disk
-            temp_path = Path(f.name)
-        
-        try:
-            yield temp_path
-        finally:
-            temp_path.unlink(missing_ok=True)
+    @pytest.fixture(scope="session")
+    def _ledger_template_content(self):
+        """Read the sample beancount file once per session."""
+        return (FIXTURES_DIR / "sample.beancount").read_bytes()
 
-    @pytest.fixture
+    @pytest.fixture(scope="session")
+    def test_ledger_file(self, tmp_path_factory, _ledger_template_content):
+        """Write the sample ledger to a temporary directory for testing."""
+        path = tmp_path_factory.mktemp("ledger") / "sample.beancount"
+        path.write_bytes(_ledger_template_content)
+        return path
+
+    @pytest.fixture(scope="session")
     def extension(self, test_ledger_file):
         """Create a FixUncategorized extension with a real ledger."""
-        # Load the ledger and force it to process entries
+        # FavaLedger parses the beancount file on construction, no extra load_file() needed.
+        # Use the instance the ledger registered, so its after_load_file() hook runs on reloads.
         ledger = FavaLedger(test_ledger_file)
-        ledger.load_file()  # Force loading of the beancount file
-        extension = FixUncategorized(ledger)
+        extension = ledger.extensions.get_extension("FixUncategorized")
+        assert isinstance(extension, FixUncategorized)
         return extension
 
+    @pytest.fixture(scope="module")
+    def flask_app(self, extension):
+        """Create one Flask app for the module, routing /save to the extension."""
+        app = Flask(__name__)
+        # Fava's provider knows how to serialise the entries in the save response
+        app.json = FavaJSONProvider(app)
+        app.add_url_rule("/save", view_func=extension.save, methods=["POST"])
+        return app
+
+    @pytest.fixture(scope="module")
+    def client(self, flask_app):
+        """Share a single test client between the save endpoint tests."""
+        return flask_app.test_client()
+
+    @pytest.fixture(autouse=True)
+    def restore_ledger(self, extension, test_ledger_file, _ledger_template_content):
+        """Undo changes a test made to the shared ledger file and reload it."""
+        yield
+        if test_ledger_file.read_bytes() != _ledger_template_content:
+            test_ledger_file.write_bytes(_ledger_template_content)
+            extension.ledger.load_file()
+
+    @pytest.fixture
+    def original_ledger_content(self, _ledger_template_content):
+        """Content of the ledger file before the test, as restore_ledger leaves it."""
+        return _ledger_template_content.decode()
+
+    @pytest.fixture
+    def uncategorized_txn(self, extension, flask_app):
+        """First uncategorized transaction returned by the list endpoint."""
+        with flask_app.test_request_context('/'):
+            list_data = _loads(extension.list())
+        uncategorized_txns = [t for t in list_data["transactions"] if t["unclassified"]]
+        assert uncategorized_txns, "No uncategorized transactions found for testing"
+        return uncategorized_txns[0]
+
     def test_expense_accounts_filtering(self, extension):
         """Test that expense_accounts returns the correct filtered accounts."""
         result = extension.expense_accounts()
@@ -72,15 +98,11 @@ class TestFixUncategorizedAPI:
         
         assert result == expected_accounts
 
-    def test_list_endpoint_returns_all_transactions(self, extension):
+    def test_list_endpoint_returns_all_transactions(self, extension, flask_app):
         """Test the list endpoint returns all transactions with proper structure."""
-        # Mock Flask request context
-        from flask import Flask
-        app = Flask(__name__)
-        
-        with app.test_request_context('/?time='):
+        with flask_app.test_request_context('/?time='):
             response = extension.list()
-            data = json.loads(response.data)
+            data = _loads(response)
             
             assert data["success"] is True
             assert "transactions" in data
@@ -119,24 +141,21 @@ class TestFixUncategorizedAPI:
                 for field in required_fields:
                     assert field in txn
 
-    def test_list_endpoint_filters_by_time(self, extension):
+    def test_list_endpoint_filters_by_time(self, extension, flask_app):
         """Test the list endpoint filters transactions by time parameter."""
-        from flask import Flask
-        app = Flask(__name__)
-        
         # Test with no time filter
-        with app.test_request_context('/'):
+        with flask_app.test_request_context('/'):
             response = extension.list()
-            data = json.loads(response.data)
+            data = _loads(response)
             
             assert data["success"] is True
             transactions = data["transactions"]
             all_transactions_count = len(transactions)
         
         # Test filtering to January 2024
-        with app.test_request_context('/?time=2024-02'):
+        with flask_app.test_request_context('/?time=2024-02'):
             response = extension.list()
-            data = json.loads(response.data)
+            data = _loads(response)
             
             assert data["success"] is True
             transactions = data["transactions"]
@@ -157,14 +176,37 @@ class TestFixUncategorizedAPI:
                 ]
             })
 
-    def test_list_endpoint_handles_errors_gracefully(self, extension):
+    def test_list_endpoint_time_filter_excludes_end_date(self, extension, flask_app):
+        """Test that the time filter leaves out the first day after the period."""
+        # December 2023 ends before the 2024-01-01 grocery transaction
+        with flask_app.test_request_context('/?time=2023-12'):
+            data = _loads(extension.list())
+
+        assert data["success"] is True
+        assert data["transactions"] == []
+
+    @pytest.mark.parametrize("use_orjson", [True, False], ids=["orjson", "jsonify"])
+    def test_list_endpoint_serializes_with_and_without_orjson(self, extension, flask_app, monkeypatch, use_orjson):
+        """Test that the list response is the same with orjson and with the jsonify fallback."""
+        if use_orjson:
+            assert fava_fix_uncategorized.orjson is not None, "orjson is part of the dev extra"
+        else:
+            monkeypatch.setattr(fava_fix_uncategorized, "orjson", None)
+
+        with flask_app.test_request_context('/'):
+            response = extension.list()
+            data = _loads(response)
+
+        assert response.mimetype == "application/json"
+        assert data["success"] is True
+        assert [t["date"] for t in data["transactions"]] == ["2024-01-01", "2024-02-03"]
+        assert data["expense_accounts"] == extension.expense_accounts()
+
+    def test_list_endpoint_handles_errors_gracefully(self, extension, flask_app):
         """Test that the list endpoint properly attaches errors to transactions."""
-        from flask import Flask
-        app = Flask(__name__)
-        
-        with app.test_request_context('/'):
+        with flask_app.test_request_context('/'):
             response = extension.list()
-            data = json.loads(response.data)
+            data = _loads(response)
             
             assert data["success"] is True
             transactions = data["transactions"]
@@ -182,16 +224,13 @@ class TestFixUncategorizedAPI:
             assert any(keyword in error_messages.lower() for keyword in ["balance", "imbalance", "sum"]), \
                 f"Error should mention balance/imbalance: {error_messages}"
 
-    def test_save_endpoint_returns_error_when_hash_not_found(self, extension):
+    def test_save_endpoint_returns_error_when_hash_not_found(self, client):
         """Test that the save endpoint validates input properly."""
-        from flask import Flask
-        app = Flask(__name__)
-        
         # Test with empty request data
-        with app.test_request_context('/', json={}):
-            result = extension.save()
-            assert result["success"] is True
-            assert result["data"] == []
+        response = client.post("/save", json={})
+        result = response.get_json()
+        assert result["success"] is True
+        assert result["data"] == []
         
         # Test with transactions but no postings
         test_data = {
@@ -202,33 +241,14 @@ class TestFixUncategorizedAPI:
             }]
         }
         
-        with app.test_request_context('/', json=test_data):
-            result = extension.save()
-            # The result might be a tuple (dict, status_code) when there's an error
-            if isinstance(result, tuple):
-                result, status_code = result
-                assert status_code == 500
-            # If it doesn't find the entry, it should raise an error
-            assert result["success"] is False
-
-    def test_save_endpoint_rejects_invalid_postings(self, extension, test_ledger_file):
+        response = client.post("/save", json=test_data)
+        # If it doesn't find the entry, it should raise an error
+        assert response.status_code == 500
+        result = response.get_json()
+        assert result["success"] is False
+
+    def test_save_endpoint_rejects_invalid_postings(self, test_ledger_file, client, uncategorized_txn, original_ledger_content):
         """Test that the save endpoint rejects invalid posting amounts."""
-        from flask import Flask
-        app = Flask(__name__)
-        
-        # Get original file content
-        original_content = test_ledger_file.read_text()
-        
-        # Get a real uncategorized transaction from the ledger first
-        with app.test_request_context('/'):
-            list_response = extension.list()
-            list_data = json.loads(list_response.data)
-            
-        # Find first uncategorized transaction
-        uncategorized_txns = [t for t in list_data["transactions"] if t["unclassified"]]
-        assert uncategorized_txns, "No uncategorized transactions found for testing"
-        uncategorized_txn = uncategorized_txns[0]
-        
         # Test with invalid amount format
         test_data = {
             "transactions": [{
@@ -240,38 +260,21 @@ class TestFixUncategorizedAPI:
             }]
         }
         
-        with app.test_request_context('/', json=test_data):
-            result = extension.save()
-            # Should succeed but skip the invalid posting and fall back to Unclassified
-            assert result["success"] is True
-            assert isinstance(result["data"], list)
+        response = client.post("/save", json=test_data)
+        result = response.get_json()
+        # Should succeed but skip the invalid posting and fall back to Unclassified
+        assert result["success"] is True
+        assert isinstance(result["data"], list)
             
-            # Verify file was modified (invalid posting skipped, falls back to default)
-            modified_content = test_ledger_file.read_text()
-            assert modified_content != original_content, "File should be modified even with invalid posting"
-            # Should not contain the invalid currency but should have the fallback
-            assert "ABCD" not in modified_content, "Invalid currency should not appear in file"
-            assert "Expenses:Family:Unclassified" in modified_content, "Should fall back to Unclassified posting"
-
-    def test_save_endpoint_with_valid_data(self, extension, test_ledger_file):
+        # Verify file was modified (invalid posting skipped, falls back to default)
+        modified_content = test_ledger_file.read_text()
+        assert modified_content != original_ledger_content, "File should be modified even with invalid posting"
+        # Should not contain the invalid currency but should have the fallback
+        assert "ABCD" not in modified_content, "Invalid currency should not appear in file"
+        assert "Expenses:Family:Unclassified" in modified_content, "Should fall back to Unclassified posting"
+
+    def test_save_endpoint_with_valid_data(self, test_ledger_file, client, uncategorized_txn, original_ledger_content):
         """Test the save endpoint with valid transaction data and verify file modification."""
-        from flask import Flask
-        app = Flask(__name__)
-        
-        # Get original file content
-        original_content = test_ledger_file.read_text()
-        
-        # Get a real uncategorized transaction from the ledger
-        with app.test_request_context('/'):
-            list_response = extension.list()
-            list_data = json.loads(list_response.data)
-        
-        # Find first uncategorized transaction
-        uncategorized_txns = [t for t in list_data["transactions"] if t["unclassified"]]
-        assert uncategorized_txns, "No uncategorized transactions found for testing"
-        
-        uncategorized_txn = uncategorized_txns[0]
-        
         # Prepare save data with new postings
         save_data = {
             "transactions": [{
@@ -284,41 +287,26 @@ class TestFixUncategorizedAPI:
         }
         
         # Attempt to save the transaction
-        with app.test_request_context('/', json=save_data):
-            result = extension.save()
+        response = client.post("/save", json=save_data)
+        result = response.get_json()
             
-            # Verify the response structure
-            assert result["success"] is True
-            assert isinstance(result["data"], list)
-            assert len(result["data"]) == 1
+        # Verify the response structure
+        assert result["success"] is True
+        assert isinstance(result["data"], list)
+        assert len(result["data"]) == 1
             
-            # Verify file was actually modified
-            modified_content = test_ledger_file.read_text()
-            assert modified_content != original_content, "File content should have changed after save"
-            assert "Expenses:Family:Groceries" in modified_content, "New account should appear in file"
+        # Verify file was actually modified
+        modified_content = test_ledger_file.read_text()
+        assert modified_content != original_ledger_content, "File content should have changed after save"
+        assert "Expenses:Family:Groceries" in modified_content, "New account should appear in file"
 
-    def test_save_endpoint_saves_narration_changes(self, extension, test_ledger_file):
+    def test_save_endpoint_saves_narration_changes(self, test_ledger_file, client, uncategorized_txn, original_ledger_content):
         """Test that the save endpoint saves narration changes when provided."""
-        from flask import Flask
-        app = Flask(__name__)
-        
-        # Get original file content
-        original_content = test_ledger_file.read_text()
-        
-        # Get a transaction from the ledger
-        with app.test_request_context('/'):
-            list_response = extension.list()
-            list_data = json.loads(list_response.data)
-        
-        # Get transactions by date
-        transactions_by_date = {t["date"]: t for t in list_data["transactions"]}
-        grocery_txn = transactions_by_date["2024-01-01"]  # Grocery Store transaction
-        
         # Prepare save data with narration change
         save_data = {
             "transactions": [{
-                "hash": grocery_txn["hash"],
-                "lineno": grocery_txn["lineno"],
+                "hash": uncategorized_txn["hash"],
+                "lineno": uncategorized_txn["lineno"],
                 "postings": [
                     {"account": "Expenses:Family:Groceries", "amount": "150.00 CHF"}
                 ],
@@ -327,16 +315,127 @@ class TestFixUncategorizedAPI:
         }
         
         # Attempt to save the transaction
-        with app.test_request_context('/', json=save_data):
-            result = extension.save()
+        response = client.post("/save", json=save_data)
+        result = response.get_json()
             
-            # Verify the response structure
-            assert result["success"] is True
-            assert isinstance(result["data"], list)
-            assert len(result["data"]) == 1
+        # Verify the response structure
+        assert result["success"] is True
+        assert isinstance(result["data"], list)
+        assert len(result["data"]) == 1
             
-            # Verify file was modified with new narration
-            modified_content = test_ledger_file.read_text()
-            assert modified_content != original_content, "File content should have changed after save"
-            assert "Updated weekly groceries shopping" in modified_content, "New narration should appear in file"
-            assert "Expenses:Family:Groceries" in modified_content, "New account should appear in file"
\ No newline at end of file
+        # Verify file was modified with new narration
+        modified_content = test_ledger_file.read_text()
+        assert modified_content != original_ledger_content, "File content should have changed after save"
+        assert "Updated weekly groceries shopping" in modified_content, "New narration should appear in file"
+        assert "Expenses:Family:Groceries" in modified_content, "New account should appear in file"
+
+    def test_save_endpoint_skips_unchanged_transactions(self, extension, test_ledger_file, flask_app, client, uncategorized_txn):
+        """Test that saving a transaction again without changes leaves the file untouched."""
+        postings = [{"account": "Expenses:Family:Groceries", "amount": "150.00 CHF"}]
+        save_data = {"transactions": [{**uncategorized_txn, "postings": postings}]}
+        assert client.post("/save", json=save_data).get_json()["success"] is True
+        extension.ledger.load_file()
+
+        # Same transaction after the first save, with its new hash
+        with flask_app.test_request_context('/'):
+            list_data = _loads(extension.list())
+        saved_txn = next(t for t in list_data["transactions"] if t["lineno"] == uncategorized_txn["lineno"])
+        content = test_ledger_file.read_bytes()
+        mtime_ns = test_ledger_file.stat().st_mtime_ns
+
+        save_data = {"transactions": [{**saved_txn, "postings": postings}]}
+        result = client.post("/save", json=save_data).get_json()
+        assert result["success"] is True
+        assert result["data"][0]["new_slice"] == result["data"][0]["slice"]
+        assert test_ledger_file.read_bytes() == content
+        assert test_ledger_file.stat().st_mtime_ns == mtime_ns
+
+    def test_save_endpoint_same_transaction_twice_keeps_last_edit(self, test_ledger_file, client, uncategorized_txn):
+        """Test that listing a transaction twice in one save applies the last edit."""
+        save_data = {
+            "transactions": [
+                {**uncategorized_txn, "postings": [{"account": "Expenses:Family:Groceries", "amount": "150.00 CHF"}]},
+                {**uncategorized_txn, "postings": [{"account": "Expenses:Family:Restaurants", "amount": "150.00 CHF"}]},
+            ]
+        }
+
+        response = client.post("/save", json=save_data)
+        assert response.status_code == 200
+        assert response.get_json()["success"] is True
+
+        modified_content = test_ledger_file.read_text()
+        assert "  Expenses:Family:Restaurants 150.00 CHF\n" in modified_content
+        assert "Expenses:Family:Groceries 150.00 CHF" not in modified_content
+
+    def test_save_endpoint_without_fava_file_lock(self, extension, test_ledger_file, client, uncategorized_txn, monkeypatch):
+        """Test that saving still works if fava's FileModule has no _lock attribute."""
+        monkeypatch.delattr(extension.ledger.file, "_lock")
+        save_data = {"transactions": [{**uncategorized_txn, "postings": [{"account": "Expenses:Family:Groceries", "amount": "150.00 CHF"}]}]}
+
+        assert client.post("/save", json=save_data).get_json()["success"] is True
+        assert "  Expenses:Family:Groceries 150.00 CHF\n" in test_ledger_file.read_text()
+
+    def test_save_entry_slices_rejects_generated_entries(self, extension):
+        """Test that entries generated by plugins are reported with their line, not written."""
+        entry = extension.ledger.all_entries_by_type.Transaction[0]
+        slice_string, sha256sum = get_entry_slice(entry)
+        patch = ("hash", entry, 12, slice_string, sha256sum)
+
+        with pytest.raises(FavaAPIError, match="line 12: The entry is generated"):
+            extension._save_entry_slices("<auto_insert_open>", [patch])
+
+    def test_expense_accounts_cached_until_reload(self, extension, test_ledger_file):
+        """Test that expense_accounts is reused until the ledger is reloaded."""
+        first = extension.expense_accounts()
+        assert extension.expense_accounts() is first
+
+        test_ledger_file.write_text(
+            test_ledger_file.read_text() + "\n1990-01-01 open Expenses:Family:Travel\n"
+        )
+        extension.ledger.load_file()
+
+        assert "Expenses:Family:Travel" in extension.expense_accounts()
+
+    def test_save_endpoint_saves_multiple_transactions_in_one_file(self, extension, test_ledger_file, flask_app, client):
+        """Test that saving several transactions of the same file patches each one in place."""
+        with flask_app.test_request_context('/'):
+            list_data = _loads(extension.list())
+        transactions_by_date = {t["date"]: t for t in list_data["transactions"]}
+
+        save_data = {
+            "transactions": [
+                {
+                    "hash": transactions_by_date["2024-01-01"]["hash"],
+                    "lineno": transactions_by_date["2024-01-01"]["lineno"],
+                    # Two postings: the entry grows and shifts the entries below it
+                    "postings": [
+                        {"account": "Expenses:Family:Groceries", "amount": "100.00 CHF"},
+                        {"account": "Expenses:Family:Restaurants", "amount": "50.00 CHF"},
+                    ],
+                },
+                {
+                    "hash": transactions_by_date["2024-02-03"]["hash"],
+                    "lineno": transactions_by_date["2024-02-03"]["lineno"],
+                    "postings": [
+                        {"account": "Income:Salary", "amount": "-2500.00 CHF"},
+                    ],
+                },
+            ]
+        }
+
+        inode = test_ledger_file.stat().st_ino
+        response = client.post("/save", json=save_data)
+        result = response.get_json()
+        assert result["success"] is True
+        assert len(result["data"]) == 2
+
+        # Written in place, like fava's own saves, so links and ownership are kept
+        assert test_ledger_file.stat().st_ino == inode
+        modified_content = test_ledger_file.read_text()
+        assert "  Expenses:Family:Groceries 100.00 CHF\n  Expenses:Family:Restaurants 50.00 CHF\n" in modified_content
+        assert "  Income:Salary -2500.00 CHF\n" in modified_content
+        assert "-2000.00 CHF" not in modified_content
+
+        # The rewritten file is still a valid ledger without the previous imbalance
+        extension.ledger.load_file()
+        assert not extension._get_errors()
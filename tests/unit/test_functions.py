@@ -5,141 +5,106 @@ from fava_fix_uncategorized import normalize_and_validate_posting, replace_uncla
 class TestNormalizeAndValidatePosting:
     """Test the normalize_and_validate_posting function."""
 
-    def test_valid_amount_with_currency(self):
-        posting = {"account": "Expenses:Food", "amount": "123.45 CHF"}
-        result = normalize_and_validate_posting(posting)
-        assert result["amount"] == "123.45 CHF"
-
-    def test_valid_amount_without_currency_uses_default(self):
-        posting = {"account": "Expenses:Food", "amount": "123.45"}
-        result = normalize_and_validate_posting(posting)
-        assert result["amount"] == "123.45 CHF"
-
-    def test_amount_with_commas(self):
-        posting = {"account": "Expenses:Food", "amount": "1,234.56 USD"}
-        result = normalize_and_validate_posting(posting)
-        assert result["amount"] == "1234.56 USD"
-
-    def test_negative_amount(self):
-        posting = {"account": "Expenses:Food", "amount": "-50.00 EUR"}
-        result = normalize_and_validate_posting(posting)
-        assert result["amount"] == "-50.00 EUR"
-
-    def test_amount_with_spaces(self):
-        posting = {"account": "Expenses:Food", "amount": "  123.45   CHF  "}
-        result = normalize_and_validate_posting(posting)
-        assert result["amount"] == "123.45 CHF"
-
-    def test_empty_amount(self):
-        posting = {"account": "Expenses:Food", "amount": ""}
-        result = normalize_and_validate_posting(posting)
-        assert result["amount"] == ""
-
-    def test_invalid_amount_format(self):
-        posting = {"account": "Expenses:Food", "amount": "invalid"}
-        with pytest.raises(ValueError, match="Invalid amount format"):
-            normalize_and_validate_posting(posting)
-
-    def test_currency_converted_to_uppercase(self):
-        posting = {"account": "Expenses:Food", "amount": "100.00 usd"}
-        result = normalize_and_validate_posting(posting)
-        assert result["amount"] == "100.00 USD"
-
-
-class TestReplaceUnclassifiedPosting:
-    """Test the replace_unclassified_posting function."""
-
-    def test_replace_single_expenses_line(self):
-        entry_str = """2024-01-01 * "Test"
+    @pytest.mark.parametrize("amount_in, expected, raises", [
+        pytest.param("123.45 CHF", "123.45 CHF", None, id="valid_amount_with_currency"),
+        pytest.param("123.45", "123.45 CHF", None, id="valid_amount_without_currency_uses_default"),
+        pytest.param("1,234.56 USD", "1234.56 USD", None, id="amount_with_commas"),
+        pytest.param("-50.00 EUR", "-50.00 EUR", None, id="negative_amount"),
+        pytest.param("  123.45   CHF  ", "123.45 CHF", None, id="amount_with_spaces"),
+        pytest.param("", "", None, id="empty_amount"),
+        pytest.param("invalid", None, ValueError, id="invalid_amount_format"),
+        pytest.param("100.00 usd", "100.00 USD", None, id="currency_converted_to_uppercase"),
+    ])
+    def test_normalize_amount(self, amount_in, expected, raises):
+        posting = {"account": "Expenses:Food", "amount": amount_in}
+        if raises:
+            with pytest.raises(raises, match="Invalid amount format"):
+                normalize_and_validate_posting(posting)
+        else:
+            result = normalize_and_validate_posting(posting)
+            assert result["amount"] == expected
+
+
+ENTRY = """2024-01-01 * "Test"
   Assets:Checking      -100.00 CHF
   Expenses:Family:Unclassified"""
-        
-        new_postings = [{"account": "Expenses:Food", "amount": "100.00 CHF"}]
-        result = replace_unclassified_posting(entry_str, new_postings)
-        
-        expected_lines = [
-            "2024-01-01 * \"Test\"",
-            "  Assets:Checking      -100.00 CHF",
-            "  Expenses:Food 100.00 CHF",
-            "  Expenses:Family:Unclassified 0 CHF"
-        ]
-        assert result == "\n".join(expected_lines)
-
-    def test_replace_multiple_expenses_lines(self):
-        entry_str = """2024-01-01 * "Test"
-  Assets:Checking      -150.00 CHF
-  Expenses:Family:Unclassified"""
-        
-        new_postings = [
-            {"account": "Expenses:Food", "amount": "100.00 CHF"},
-            {"account": "Expenses:Transport", "amount": "50.00 CHF"}
-        ]
-        result = replace_unclassified_posting(entry_str, new_postings)
-        
-        lines = result.split('\n')
-        assert "  Expenses:Food 100.00 CHF" in lines
-        assert "  Expenses:Transport 50.00 CHF" in lines
-        assert "  Expenses:Family:Unclassified 0 CHF" in lines
 
-    def test_preserve_non_expenses_lines(self):
-        entry_str = """2024-01-01 * "Test"
-  Assets:Checking      -100.00 CHF
-  Assets:Savings       100.00 CHF
-  Expenses:Family:Unclassified"""
-        
-        new_postings = [{"account": "Expenses:Food", "amount": "50.00 CHF"}]
-        result = replace_unclassified_posting(entry_str, new_postings)
-        
-        assert "Assets:Checking      -100.00 CHF" in result
-        assert "Assets:Savings       100.00 CHF" in result
 
-    def test_no_new_postings_keeps_unclassified(self):
-        entry_str = """2024-01-01 * "Test"
-  Assets:Checking      -100.00 CHF
-  Expenses:Family:Unclassified"""
-        
-        new_postings = []
-        result = replace_unclassified_posting(entry_str, new_postings)
-        
-        # When no new postings provided, original should remain unchanged
-        assert "Expenses:Family:Unclassified" in result
-        assert result.strip() == entry_str.strip()
-
-    def test_preserve_indentation(self):
-        entry_str = """2024-01-01 * "Test"
-    Assets:Checking      -100.00 CHF
-    Expenses:Family:Unclassified"""
-        
-        new_postings = [{"account": "Expenses:Food", "amount": "100.00 CHF"}]
-        result = replace_unclassified_posting(entry_str, new_postings)
-        
-        lines = result.split('\n')
-        # Should preserve the 4-space indentation
-        assert any(line.startswith("    Expenses:Food") for line in lines)
+class TestReplaceUnclassifiedPosting:
+    """Test the replace_unclassified_posting function."""
 
-    def test_replace_with_invalid_posting_format(self):
-        """Test that replace_unclassified_posting handles invalid posting formats gracefully."""
-        entry_str = """2024-01-01 * "Test"
-  Assets:Checking      -100.00 CHF
-  Expenses:Family:Unclassified"""
-        
-        # Include some invalid postings that should be skipped
-        new_postings = [
-            {"account": "Expenses:Food", "amount": "100.00 CHF"},  # Valid
-            {"account": "Expenses:Transport", "amount": "invalid_amount"},  # Invalid - will be skipped
-            {"account": "Expenses:Shopping", "amount": "50.00 CHF"},  # Valid
-        ]
-        
+    @pytest.mark.parametrize("entry_str, new_postings, expected, must_contain, must_not_contain", [
+        pytest.param(
+            ENTRY,
+            [{"account": "Expenses:Food", "amount": "100.00 CHF"}],
+            "\n".join([
+                '2024-01-01 * "Test"',
+                "  Assets:Checking      -100.00 CHF",
+                "  Expenses:Food 100.00 CHF",
+                "  Expenses:Family:Unclassified 0 CHF",
+            ]),
+            [],
+            [],
+            id="single",
+        ),
+        pytest.param(
+            ENTRY,
+            [{"account": "Expenses:Food", "amount": "100.00 CHF"},
+             {"account": "Expenses:Transport", "amount": "50.00 CHF"}],
+            None,
+            ["  Expenses:Food 100.00 CHF", "  Expenses:Transport 50.00 CHF",
+             "  Expenses:Family:Unclassified 0 CHF"],
+            [],
+            id="multiple",
+        ),
+        pytest.param(
+            ENTRY.replace("CHF\n", "CHF\n  Assets:Savings       100.00 CHF\n"),
+            [{"account": "Expenses:Food", "amount": "50.00 CHF"}],
+            None,
+            ["  Assets:Checking      -100.00 CHF", "  Assets:Savings       100.00 CHF"],
+            [],
+            id="preserve_non_expenses",
+        ),
+        pytest.param(
+            # When no new postings provided, original should remain unchanged
+            ENTRY,
+            [],
+            ENTRY,
+            [],
+            [],
+            id="empty",
+        ),
+        pytest.param(
+            ENTRY.replace("\n  ", "\n    "),
+            [{"account": "Expenses:Food", "amount": "100.00 CHF"}],
+            None,
+            # Should preserve the 4-space indentation
+            ["    Expenses:Food 100.00 CHF", "    Expenses:Family:Unclassified 0 CHF"],
+            [],
+            id="indent",
+        ),
+        pytest.param(
+            ENTRY,
+            # Invalid postings are skipped, the valid ones are kept
+            [{"account": "Expenses:Food", "amount": "100.00 CHF"},
+             {"account": "Expenses:Transport", "amount": "invalid_amount"},
+             {"account": "Expenses:Shopping", "amount": "50.00 CHF"}],
+            None,
+            ["  Expenses:Food 100.00 CHF", "  Expenses:Shopping 50.00 CHF",
+             "  Expenses:Family:Unclassified 0 CHF"],
+            ["invalid_amount"],
+            id="invalid_posting",
+        ),
+    ])
+    def test_replace(self, entry_str, new_postings, expected, must_contain, must_not_contain):
         result = replace_unclassified_posting(entry_str, new_postings)
-        
-        lines = result.split('\n')
-        # Should include valid postings
-        assert any("Expenses:Food 100.00 CHF" in line for line in lines)
-        assert any("Expenses:Shopping 50.00 CHF" in line for line in lines)
-        # Invalid posting should be skipped (not included)
-        assert not any("invalid_amount" in line for line in lines)
-        # Should still add the unclassified line with 0 amount
-        assert any("Expenses:Family:Unclassified 0 CHF" in line for line in lines)
+        if expected is not None:
+            assert result == expected
+        lines = result.split("\n")
+        for line in must_contain:
+            assert line in lines
+        for substring in must_not_contain:
+            assert not any(substring in line for line in lines)
 
 
 class TestChangeNarration: